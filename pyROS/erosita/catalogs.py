@@ -3,20 +3,34 @@ Class definitions for defining eROSITA specific data types.
 """
 import os
 import pathlib as pt
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 
 import astropy.units as u
 import numpy as np
-import requests
+import pandas as pd
 from astropy.coordinates import SkyCoord
 
 from pyROS.erosita.sources import eRASS1Source
-from pyROS.queries import Database, _included_erosita_columns
-from pyROS.utils import EHalo, _enforce_style, mylog
+from pyROS.queries import _DATABASE_REGISTRY, Database, _included_erosita_columns
+from pyROS.utils import (
+    HTTP_SESSION,
+    EHalo,
+    SQLiteWriter,
+    _enforce_style,
+    dispose_sqlite_engine,
+    get_sqlite_engine,
+    mylog,
+)
 
 _object_map = {"eRASS1": eRASS1Source}
 
+# -- SQLite column types by numpy dtype kind; anything else is stored as text -- #
+_sqlite_types = {"b": "INTEGER", "i": "INTEGER", "u": "INTEGER", "f": "REAL"}
 
-def download_data_product(url, output_location):
+
+def download_data_product(url, output_location, keep_archive=True):
     """
     download a data product from eROSITA from a url.
 
@@ -26,35 +40,106 @@ def download_data_product(url, output_location):
         The URL to the data product to download.
     output_location: str
         The location at which to save the data product.
+    keep_archive: bool, optional
+        If ``True`` (default), the archive itself is saved to ``output_location`` before it is extracted. Otherwise, the
+        download is extracted as it streams in and the archive never touches the disk.
 
     Returns
     -------
     None
 
     """
+    import tarfile
+
+    _archive_path = os.path.join(output_location, pt.Path(url).name)
+
     # the download must take place.
     mylog.info(f"Downloading from {url}.")
     with EHalo(text="Downloading..."):
-        response = requests.get(url)
-    # check run
-    if not response.ok:
-        raise ValueError(f"The download of {url} failed.")
-    with open(os.path.join(output_location, pt.Path(url).name), mode="wb") as _f:
-        _f.write(response.content)
-    # unzip
-    import tarfile
+        with HTTP_SESSION.get(url, stream=True) as response:
+            # check run
+            if not response.ok:
+                raise ValueError(f"The download of {url} failed.")
+
+            response.raw.decode_content = True
+
+            if not keep_archive:
+                # the tarball is read sequentially, so it can be unpacked straight off the socket.
+                with tarfile.open(fileobj=response.raw, mode="r|*") as _f:
+                    _f.extractall(output_location)
+                return
 
+            # stream to disk in 1 MiB blocks rather than holding the archive in memory.
+            with open(_archive_path, mode="wb") as _f:
+                shutil.copyfileobj(response.raw, _f, length=1 << 20)
+
+    # unzip
     with EHalo(text="Unzipping..."):
-        with tarfile.open(os.path.join(output_location, pt.Path(url).name)) as _f:
+        with tarfile.open(_archive_path, mode="r|*") as _f:
             _f.extractall(output_location)
 
 
+def _read_fitsio(filename, columns=None):
+    """
+    Read the first table extension of a FITS file into a :py:class:`pandas.DataFrame` using ``fitsio``.
+
+    Parameters
+    ----------
+    filename: str
+        The FITS file to read.
+    columns: list of str, optional
+        The columns to read. If ``None``, all columns are read.
+
+    Returns
+    -------
+    :py:class:`pandas.DataFrame`
+    """
+    import fitsio
+
+    _array = fitsio.read(filename, ext=1, columns=columns)
+
+    _data = {}
+    for name in _array.dtype.names:
+        _column = _array[name]
+
+        if _column.dtype.kind == "S":
+            _column = np.char.decode(_column, "ascii")
+        if _column.dtype.kind == "U":
+            _column = np.char.rstrip(_column)
+
+        # FITS data are big-endian; pandas requires native byte order.
+        _data[name] = _column.astype(_column.dtype.newbyteorder("="))
+
+    return pd.DataFrame(_data)
+
+
 class eROSITACatalog:
     """
     Class representation of an eROSITA catalog.
     """
 
-    def __init__(self, filename, format="fits", catalog_type="eRASS1"):
+    xref_columns = [
+        "UID",
+        "RA",
+        "DEC",
+        "RA_LOWERR",
+        "RA_UPERR",
+        "DEC_LOWERR",
+        "DEC_UPERR",
+        "EXT",
+    ]  #: The catalog columns required to generate an XREF database.
+    xref_indexes = [
+        "UID"
+    ]  #: The XREF table columns indexed once the tables are loaded.
+
+    def __init__(
+        self,
+        filename,
+        format="fits",
+        catalog_type="eRASS1",
+        columns=None,
+        engine="astropy",
+    ):
         """
         Initializes the :py:class:`eROSITACatalog` instance.
 
@@ -64,15 +149,52 @@ class eROSITACatalog:
             The name of the file in which the catalog is stored on disk.
         format: str, optional
             The format of the storage file. Default is ``fits``.
+        catalog_type: str, optional
+            The data release of the catalog. Default is ``eRASS1``.
+        columns: list of str, optional
+            The columns to load. If ``None`` (default), all columns are loaded. Loading only the columns that are
+            needed (i.e. :py:attr:`eROSITACatalog.xref_columns`) greatly reduces the memory footprint for large catalogs.
+        engine: str, optional
+            The backend used to read the catalog; either ``astropy`` (default) or ``fitsio``. ``fitsio`` is faster and
+            lighter on memory for large FITS tables, but is an optional dependency and only reads FITS files. If it is
+            not installed, or ``format`` is not ``fits``, ``astropy`` is used instead.
         """
         from astropy.table import Table
 
         self.filename = filename
-        self.data = Table.read(filename, format=format).to_pandas()
 
-        # properties initialization #
-        self._coordinates = None
-        self._objects = None
+        if engine not in ["astropy", "fitsio"]:
+            raise ValueError(f"{engine} is not a recognized catalog reading engine.")
+
+        if engine == "fitsio" and format != "fits":
+            mylog.warning(
+                f"fitsio cannot read {format} catalogs. Reading catalog with astropy."
+            )
+            engine = "astropy"
+
+        if engine == "fitsio":
+            try:
+                import fitsio  # noqa: F401
+            except ImportError:
+                mylog.warning("fitsio is not installed. Reading catalog with astropy.")
+                engine = "astropy"
+
+        if engine == "fitsio":
+            self.data = _read_fitsio(filename, columns=columns)
+        else:
+            # FITS tables are memory mapped so that unused columns are never read from disk.
+            _table = Table.read(
+                filename,
+                format=format,
+                **({"memmap": True} if format == "fits" else {}),
+            )
+            if columns is not None:
+                _table = _table[list(columns)]
+
+            self.data = _table.to_pandas()
+
+        # the catalog columns served through attribute access.
+        self._col_set = frozenset(self.data.columns)
 
         # Loading the source type object
         self.source_type = _object_map[catalog_type]
@@ -86,61 +208,83 @@ class eROSITACatalog:
     def __len__(self):
         return len(self.data)
 
-    @property
+    @cached_property
     def source_objects(self):
-        if self._objects is None:
-            self._objects = self.source_type.from_pandas(self.data)
-
-        return self._objects
+        return self.source_type.from_pandas(self.data)
 
     @property
     def columns(self):
         """The available columns"""
         return list(self.data.columns)
 
-    @property
+    @cached_property
     def coordinates(self):
         """Sky coordinates for the objects in the database."""
-        if self._coordinates is None:
-            self._coordinates = self._construct_coordinates()
+        return self._construct_coordinates()
 
-        return self._coordinates
+    @cached_property
+    def xref_radii(self):
+        """The XREF search radii of the objects in the database."""
+        return self._xref_radii()
 
-    def _xref_radii(self):
+    def _xref_radii(self, factor=3):
         """
         Calculates matched XREF radii for passing through the XREF generation procedures.
+
+        Parameters
+        ----------
+        factor: float, optional
+            The multiple of the positional error to search within. Default is ``3``.
         """
-        # calculating the sky radius to consider in arcmin^2.
-        _ra_dec_error_radius = np.sqrt(
-            np.amax(np.abs([self.RA_LOWERR, self.RA_UPERR]), axis=0) ** 2
-            + (
-                np.sin(np.deg2rad(self.DEC))
-                * np.amax(np.abs([self.DEC_LOWERR, self.DEC_UPERR]), axis=0)
+        # pairwise maxima avoid building (2,N) temporaries for each error column.
+        _ra_error = np.maximum(np.abs(self.RA_LOWERR), np.abs(self.RA_UPERR))
+        _dec_error = np.maximum(np.abs(self.DEC_LOWERR), np.abs(self.DEC_UPERR))
+
+        # calculating the search radius in arcmin from the positional error radius (arcsec).
+        try:
+            import numexpr as ne
+
+            # the compound expression is evaluated in a single (multithreaded) pass without intermediate arrays.
+            error_radius = ne.evaluate(
+                "(factor * sqrt(dec_error**2 + (sin(dec * deg2rad) * ra_error)**2) + ext) / 60",
+                local_dict={
+                    "factor": factor,
+                    "ra_error": _ra_error,
+                    "dec_error": _dec_error,
+                    "dec": self.DEC,
+                    "deg2rad": np.pi / 180,
+                    "ext": self.EXT,
+                },
+            )
+        except ImportError:
+            # the RA error is scaled onto the sky by the declination term.
+            _ra_dec_error_radius = np.hypot(
+                _dec_error, np.sin(np.deg2rad(self.DEC)) * _ra_error
             )
-            ** 2
-        ) / (60)
 
-        error_radius = 3 * _ra_dec_error_radius + (self.EXT / 60)
+            error_radius = (factor * _ra_dec_error_radius + self.EXT) / 60
 
         # fixing nans
-        error_radius[np.where(np.isnan(error_radius))] = 1.0
+        np.nan_to_num(error_radius, copy=False, nan=1.0)
 
         return error_radius * u.arcmin
 
     def _construct_coordinates(self):
-        return [
-            SkyCoord(ra=kra * u.deg, dec=kdec * u.deg)
-            for kra, kdec in zip(self.data.iloc[:]["RA"], self.data.iloc[:]["DEC"])
-        ]
+        return SkyCoord(
+            ra=self.data["RA"].to_numpy() * u.deg,
+            dec=self.data["DEC"].to_numpy() * u.deg,
+            frame="icrs",
+        )
 
     def __getattr__(self, item):
-        if hasattr(super(), item):
-            return super().__getattribute__(self, item)
-        elif item in self.columns:
-            return np.array(self.data.loc[:, item])
-        else:
+        # only reached if standard lookup fails; catalog columns are memoized as attributes on first access.
+        if item.startswith("_") or item not in self.__dict__.get("_col_set", ()):
             raise AttributeError(f"No such attribute {item}.")
 
+        _column = self.data[item].to_numpy(copy=False)
+        self.__dict__[item] = _column
+        return _column
+
     def xref(
         self,
         filename,
@@ -148,6 +292,9 @@ class eROSITACatalog:
         maxthreads=10,
         included_databases="all",
         overwrite=False,
+        use_tap=False,
+        offline_catalogs=None,
+        factor=3,
         **kwargs,
     ):
         """
@@ -157,6 +304,13 @@ class eROSITACatalog:
         filename
         groupsize
         maxthreads
+        use_tap
+        offline_catalogs: dict, optional
+            Local copies of reference databases, keyed by database name (see :py:meth:`Database.query_offline`). These
+            databases are cross matched locally rather than queried.
+        factor: float, optional
+            The multiple of the positional error to search within (see :py:meth:`eROSITACatalog._xref_radii`). Default
+            is ``3``.
         kwargs
 
         Returns
@@ -169,8 +323,11 @@ class eROSITACatalog:
 
         # Managing IO
         # ------------#
+        if offline_catalogs is None:
+            offline_catalogs = {}
+
         if included_databases == "all":
-            databases = [k.__name__ for k in Database.__subclasses__()]
+            databases = list(_DATABASE_REGISTRY)
         else:
             databases = included_databases
 
@@ -180,7 +337,13 @@ class eROSITACatalog:
                 mylog.info(
                     f"Found existing XREF database at {filename}. Overwrite={overwrite}."
                 )
+                dispose_sqlite_engine(filename)
                 os.remove(filename)
+
+                # a stale write-ahead log would otherwise be replayed into the new database.
+                for _sibling in (f"{filename}-wal", f"{filename}-shm"):
+                    if os.path.exists(_sibling):
+                        os.remove(_sibling)
             else:
                 raise ValueError(
                     f"Found existing XREF database at {filename}. Overwrite={overwrite}."
@@ -189,13 +352,19 @@ class eROSITACatalog:
             # generate the necessary pathway.
             pt.Path(filename).parents[0].mkdir(parents=True, exist_ok=True)
 
+        # the search radii and coordinates are computed once and shared by every database.
+        radii = self.xref_radii if factor == 3 else self._xref_radii(factor=factor)
+        coordinates = self.coordinates
+
         # Loop over DB
         # -------------#
+        _databases = []
         for database in databases:
             mylog.info(f"Generating XREF for [{database}]...")
 
             # create reference to the database
             db = Database(database)
+            _databases.append(db)
 
             # Creating table in database
             # ---------------------------#
@@ -209,26 +378,97 @@ class eROSITACatalog:
                 }.items()
             ]
             _ = sql.Table(f"XREF_{db.__class__.__name__}", _db_meta_data, *cols)
-            _temp_engine = sql.create_engine(f"sqlite:///{filename}")
-            _db_meta_data.create_all(_temp_engine)
-
-            # Cross Referencing
-            # ------------------#
-
-            db.query_radius(
-                self.source_objects,
-                self._xref_radii(),
-                maxworkers=maxthreads,
-                group_size=groupsize,
-                connection=filename,
-            )
+            _db_meta_data.create_all(get_sqlite_engine(filename))
+
+        # Cross Referencing
+        # ------------------#
+        # Each database is a separate service with its own rate limit, so they are queried concurrently. Their results
+        # share one writer, so the XREF is ingested by a single connection in large transactions.
+        with SQLiteWriter(filename) as writer:
+            with ThreadPoolExecutor(max_workers=max(len(_databases), 1)) as executor:
+                _futures = []
+                for db in _databases:
+                    if db.__class__.__name__ in offline_catalogs:
+                        _futures.append(
+                            executor.submit(
+                                db.query_offline,
+                                self.data,
+                                radii,
+                                offline_catalogs[db.__class__.__name__],
+                                coordinates=coordinates,
+                                writer=writer,
+                            )
+                        )
+                    else:
+                        _futures.append(
+                            executor.submit(
+                                db.query_radius,
+                                self.data,
+                                radii,
+                                coordinates=coordinates,
+                                maxworkers=maxthreads,
+                                group_size=groupsize,
+                                connection=filename,
+                                use_tap=use_tap,
+                                writer=writer,
+                            )
+                        )
+
+            for _future in _futures:
+                # re-raise any exception from the query threads.
+                _future.result()
+
+        mylog.info(f"Wrote {writer.rows_written} XREF records to {filename}.")
+
+        # Indexing
+        # ---------#
+        with get_sqlite_engine(filename).begin() as conn:
+            for db in _databases:
+                _table = f"XREF_{db.__class__.__name__}"
+
+                for column in self.xref_indexes:
+                    conn.execute(
+                        sql.text(
+                            f'CREATE INDEX IF NOT EXISTS "ix_{_table}_{column}" ON "{_table}" ("{column}")'
+                        )
+                    )
 
     def add_table_to_xref(self, database):
+        """
+        Write the catalog to the ``eROSITA`` table of an XREF database, replacing any existing copy.
+
+        Parameters
+        ----------
+        database: str
+            The path to the XREF database.
+
+        Returns
+        -------
+        None
+        """
         import sqlalchemy as sql
 
-        eng = sql.create_engine(f"sqlite:///{database}")
-        with eng.connect() as conn:
-            self.data.to_sql("eROSITA", con=conn, if_exists="replace")
+        _columns = ", ".join(
+            f'"{k}" {_sqlite_types.get(v.kind, "TEXT")}'
+            for k, v in self.data.dtypes.items()
+        )
+
+        with get_sqlite_engine(database).begin() as conn:
+            conn.execute(sql.text('DROP TABLE IF EXISTS "eROSITA"'))
+            conn.execute(sql.text(f'CREATE TABLE "eROSITA" ({_columns})'))
+
+        # the rows are bulk inserted in large transactions, then indexed.
+        with SQLiteWriter(database, chunksize=10000) as writer:
+            writer.put("eROSITA", self.data)
+
+        with get_sqlite_engine(database).begin() as conn:
+            for column in self.xref_indexes:
+                if column in self._col_set:
+                    conn.execute(
+                        sql.text(
+                            f'CREATE INDEX "ix_eROSITA_{column}" ON "eROSITA" ("{column}")'
+                        )
+                    )
 
     @_enforce_style
     def plot_field(
@@ -11,25 +11,13 @@ class eROSITASource:
     _standard_keys = []
 
     def __init__(self, **kwargs):
-        # adding provided attributes
-        for k, v in kwargs.items():
-            setattr(self, k, v)
-
-        for k in self._standard_keys:
-            if k not in kwargs:
-                setattr(self, k, None)
+        # standard keys default to None unless provided.
+        self.__dict__.update(dict.fromkeys(self._standard_keys))
+        self.__dict__.update(kwargs)
 
     @classmethod
     def from_pandas(cls, pandas_df):
-        columns = pandas_df.columns
-
-        out = []
-        for k in range(len(pandas_df)):
-            out.append(
-                cls(**{col: data for col, data in zip(columns, pandas_df.iloc[k, :])})
-            )
-
-        return out
+        return [cls(**record) for record in pandas_df.to_dict(orient="records")]
 
     def __str__(self):
         return f"<eROSITA Source: {self.IAUNAME}>"
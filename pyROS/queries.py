@@ -4,6 +4,7 @@ Module for managing API queries both for eROSITA and for other databases for cro
 import threading
 import time
 import warnings
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 from itertools import repeat
 
@@ -11,21 +12,133 @@ import astropy.units as u
 import numpy as np
 import pandas as pd
 import requests.exceptions
-import sqlalchemy
-from astropy.coordinates import Angle, SkyCoord
+from astropy.coordinates import SkyCoord
+from astropy.table import Table
 from astroquery.ipac.ned import Ned
 from astroquery.simbad import Simbad
+from astroquery.utils.tap.core import TapPlus
 from tqdm.auto import tqdm
 
-from pyROS.utils import cgparams, devLogger, mylog, split
+from pyROS.utils import HTTP_SESSION, SQLiteWriter, cgparams, devLogger, mylog, split
 
 Simbad.add_votable_fields("otype")
 Simbad.TIMEOUT = 60
 Ned.TIMEOUT = 60
 
+# -- the astroquery services share the package's pooled, retrying HTTP session -- #
+HTTP_SESSION.headers.update(Simbad._session.headers)
+Simbad._session = HTTP_SESSION
+Ned._session = HTTP_SESSION
+
+# -- the query responses are noisy; their warnings are silenced once here rather than per query -- #
+warnings.filterwarnings(action="ignore", module=r"astroquery(\..*)?")
+warnings.filterwarnings(action="ignore", module=r"astropy\.io\.votable(\..*)?")
+
 _included_erosita_columns = cgparams["REFDB"]["eRASS1_Catalog"]["schema"]
 _included_erosita_columns_mod = [v[0] for v in _included_erosita_columns.values()]
 
+# -- locks shared by the query threads -- #
+_PROGRESS_LOCK = threading.Lock()  #: Serializes progress bar updates.
+
+
+def _filter_matches_numpy(ra_s, dec_s, ra_m, dec_m, radii):
+    """
+    Mask of the candidate matches lying within the search radius of their source.
+
+    Parameters
+    ----------
+    ra_s, dec_s: array
+        The positions of the source each candidate was found around (radians).
+    ra_m, dec_m: array
+        The positions of the candidates (radians).
+    radii: array
+        The search radius of each candidate's source (radians).
+
+    Returns
+    -------
+    array of bool
+    """
+    # haversine; compared against hav(radius) so that no inverse trigonometry is needed.
+    _hav = (
+        np.sin((dec_m - dec_s) / 2) ** 2
+        + np.cos(dec_s) * np.cos(dec_m) * np.sin((ra_m - ra_s) / 2) ** 2
+    )
+
+    return _hav <= np.sin(radii / 2) ** 2
+
+
+# numba is optional; the compiled kernel computes the same mask in a single pass without temporaries. It is
+# called from the query threads, so it is not parallelized itself.
+try:
+    from numba import njit
+
+    @njit(cache=True, fastmath=True)
+    def _filter_matches(ra_s, dec_s, ra_m, dec_m, radii):
+        _keep = np.empty(ra_s.shape[0], dtype=np.bool_)
+
+        for i in range(ra_s.shape[0]):
+            _hav = (
+                np.sin((dec_m[i] - dec_s[i]) / 2) ** 2
+                + np.cos(dec_s[i])
+                * np.cos(dec_m[i])
+                * np.sin((ra_m[i] - ra_s[i]) / 2) ** 2
+            )
+            _keep[i] = _hav <= np.sin(radii[i] / 2) ** 2
+
+        return _keep
+
+except ImportError:
+    _filter_matches = _filter_matches_numpy
+
+
+class RateLimiter:
+    """
+    Thread-safe sliding window rate limiter for calls to a remote service.
+
+    At most ``max_calls`` calls are permitted within any window of ``period`` seconds. Calls may burst up to
+    that limit; callers only block once the window is full.
+    """
+
+    def __init__(self, max_calls, period=1.0):
+        """
+        Initializes the :py:class:`RateLimiter` instance.
+
+        Parameters
+        ----------
+        max_calls: int
+            The maximum number of calls permitted per window.
+        period: float, optional
+            The length of the window in seconds. Default is ``1``.
+        """
+        self.max_calls = max_calls
+        self.period = period
+
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Register a call, blocking only as long as it takes for the window to have room for it.
+
+        Returns
+        -------
+        None
+        """
+        while True:
+            with self._lock:
+                _now = time.monotonic()
+
+                while len(self._calls) != 0 and _now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(_now)
+                    return
+
+                _wait = self.period - (_now - self._calls[0])
+
+            time.sleep(_wait)
+
 
 class Database:
     """
@@ -38,15 +151,23 @@ class Database:
     max_threads = 0  #: Maximum number of allowed threads.
     used_columns = {}  #: The columns to include for this database reference class.
     retries = 5  #: number of retries to give.
+    tap_service = None  #: TAP service for bulk cone searches (if supported).
+    batch_queries = False  #: Query each batch of coordinates in a single call.
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # -- precompiled output schema; identical for every query response -- #
+        cls._select_columns = tuple(cls.used_columns.keys()) + tuple(
+            _included_erosita_columns_mod
+        )
+        cls._rename_map = {k: v[0] for k, v in cls.used_columns.items()}
 
     def __new__(cls, name, *args, **kwargs):
         """Construct a database object from a given name."""
-        _subcls_dict = {u.__name__: u for u in cls.__subclasses__()}
-
-        if name in _subcls_dict:
-            obj = object.__new__(_subcls_dict[name])
-            return obj
-        else:
+        try:
+            return object.__new__(_DATABASE_REGISTRY[name])
+        except KeyError:
             raise ValueError(f"Database {name} is not a recognized reference database.")
 
     @classmethod
@@ -57,14 +178,18 @@ class Database:
         maxworkers=10,
         connection=None,
         group_size=20,
+        use_tap=False,
+        coordinates=None,
+        writer=None,
     ):
         """
         Query this database at a given radius around a standardized eROSITA object.
 
         Parameters
         ----------
-        objects: list
-            A list of ``pyROS`` objects to query over.
+        objects: list or :py:class:`pandas.DataFrame`
+            A list of ``pyROS`` objects to query over. Alternatively, a table of the objects (i.e. the catalog's ``data``)
+            containing the eROSITA columns, which avoids building source objects at all.
         radii: list
             A list (shape matching that of ``objects``) containing the search radii for each object.
         maxworkers: int
@@ -73,6 +198,14 @@ class Database:
             The database URL to which data should be written.
         group_size: int
             The minimum target group size for query batching. In general, each thread is given objects in batches of this size.
+        use_tap: bool
+            If ``True``, each batch is uploaded to the database's TAP service and cross matched in a single query instead
+            of querying each object individually. Falls back to individual queries if the database has no TAP service.
+        coordinates: :py:class:`astropy.coordinates.SkyCoord`, optional
+            The (array valued) sky coordinates of ``objects``. If not provided, they are built from the objects' RA and DEC.
+        writer: :py:class:`pyROS.utils.SQLiteWriter`, optional
+            A writer to stream the results through, so that several databases can share one writer on the same file.
+            If not provided, a writer for ``connection`` is opened and committed when the query completes.
 
         Returns
         -------
@@ -87,31 +220,42 @@ class Database:
             objects
         ), f"There must be the same number of radii {len(radii)} as supplied objects {len(objects)}."
 
-        _obj_coords = [
-            SkyCoord(ra=o.RA * u.deg, dec=o.DEC * u.deg, frame="icrs") for o in objects
-        ]
-        _obj_data = [
-            [getattr(o, col) for col in _included_erosita_columns] for o in objects
-        ]
+        _obj_frame, _obj_coords = cls._prepare_objects(objects, coordinates)
 
         # Preparing threading
         # --------------------#
         if cls.max_threads is not None:
-            _mtps = np.amin([cls.max_threads, maxworkers])
+            _mtps = min(cls.max_threads, maxworkers)
         else:
             _mtps = maxworkers
 
-        _threading_timeout_threshold = (1 / cls.max_call_frequency) * _mtps
-
         devLogger.info(
-            f"Query to {cls.__name__} running on max threads {_mtps} with max call frequency {cls.max_call_frequency}. Timeout is {_threading_timeout_threshold} seconds."
+            f"Query to {cls.__name__} running on max threads {_mtps} with max call frequency {cls.max_call_frequency}."
         )
 
-        _staged_object_coordinates = split(
-            _obj_coords, (len(_obj_coords) // group_size) + 1
-        )
-        _staged_radii = split(radii, (len(_obj_coords) // group_size) + 1)
-        _staged_object_data = split(_obj_data, (len(_obj_data) // group_size) + 1)
+        if use_tap and cls.tap_service is None:
+            mylog.warning(
+                f"{cls.__name__} has no TAP service configured. Falling back to individual queries."
+            )
+            use_tap = False
+
+        if use_tap:
+            _query_function = cls._mtqrad_tap
+        elif cls.batch_queries:
+            _query_function = cls._mtqrad_batch
+        else:
+            _query_function = cls._mtqrad
+
+        # split() balances the batch sizes to within one object; every list is split into the same groups.
+        _n_groups = max(1, -(-len(_obj_coords) // group_size))
+
+        _staged_object_coordinates = split(_obj_coords, _n_groups)
+        _staged_radii = split(radii, _n_groups)
+        # the object table is handed to the workers as row slices; nothing is converted row by row.
+        _staged_object_data = [
+            _obj_frame.iloc[_rows.start : _rows.stop]
+            for _rows in split(range(len(_obj_frame)), _n_groups)
+        ]
 
         progress_bar = tqdm(
             total=len(objects),
@@ -122,122 +266,406 @@ class Database:
 
         # Passing to threadpool
         # ----------------------#
-        with ThreadPoolExecutor(max_workers=_mtps) as executor:
-            results = executor.map(
-                cls._mtqrad,
-                _staged_object_coordinates,
-                _staged_radii,
-                _staged_object_data,
-                repeat(_threading_timeout_threshold),
-                repeat(connection),
-                repeat(progress_bar),
-            )
+        # Completed batches are post-processed here and streamed to a single writer thread while the others run.
+        if writer is not None:
+            _writer = writer
+        elif connection is not None:
+            _writer = SQLiteWriter(connection)
+        else:
+            _writer = None
 
         output_errors = 0
-        for res in results:
-            output_errors += len(res)
+        try:
+            with ThreadPoolExecutor(max_workers=_mtps) as executor:
+                for frames, errors in executor.map(
+                    _query_function,
+                    _staged_object_coordinates,
+                    _staged_radii,
+                    _staged_object_data,
+                    repeat(progress_bar),
+                ):
+                    output_errors += len(errors)
+
+                    if _writer is None:
+                        continue
+
+                    # each response frame is passed on as is; nothing is ever concatenated into one table.
+                    for frame in frames:
+                        _writer.put(f"XREF_{cls.__name__}", cls._process_output(frame))
+        finally:
+            if writer is None and _writer is not None:
+                _writer.close()
+                devLogger.info(f"Wrote {_writer.rows_written} rows to {connection}.")
 
         mylog.info(
             f"Completed query. Found {output_errors} errors from {len(objects)} queries."
         )
 
     @classmethod
-    def _mtqrad(
-        cls, coordinates, radii, object_data, timeout, connection, progress_bar
+    def query_offline(
+        cls, objects, radii, catalog, connection=None, coordinates=None, writer=None
     ):
+        """
+        Cross reference against a local copy of this database instead of querying the remote service.
+
+        Parameters
+        ----------
+        objects: list or :py:class:`pandas.DataFrame`
+            A list of ``pyROS`` objects to cross reference, or a table of them containing the eROSITA columns.
+        radii: :py:class:`astropy.units.Quantity`
+            The search radii (shape matching that of ``objects``).
+        catalog: str or :py:class:`astropy.table.Table` or :py:class:`pandas.DataFrame`
+            The local copy of the database (or a file readable by :py:meth:`astropy.table.Table.read`). It must have the
+            same columns as the database's query responses.
+        connection: str
+            The database URL to which data should be written.
+        coordinates: :py:class:`astropy.coordinates.SkyCoord`, optional
+            The (array valued) sky coordinates of ``objects``. If not provided, they are built from the objects' RA and DEC.
+        writer: :py:class:`pyROS.utils.SQLiteWriter`, optional
+            A writer to pass the results through. If not provided, the results are written to ``connection`` directly.
+
+        Returns
+        -------
+        None
+        """
+        _obj_frame, _obj_coords = cls._prepare_objects(objects, coordinates)
+        radii = u.Quantity(radii)
+
+        if len(_obj_frame) == 0:
+            mylog.info("No objects to cross match.")
+            return
+
+        if isinstance(catalog, str):
+            catalog = Table.read(catalog)
+        if isinstance(catalog, Table):
+            catalog = catalog.to_pandas()
+        else:
+            # the reformatting below must not modify the caller's table.
+            catalog = catalog.copy()
+
+        _missing_columns = [k for k in cls.used_columns if k not in catalog.columns]
+        if len(_missing_columns) != 0:
+            raise ValueError(
+                f"The local {cls.__name__} catalog is missing the columns {_missing_columns}."
+            )
+
+        mylog.info(
+            f"Cross matching {len(_obj_frame)} objects against {len(catalog)} local {cls.__name__} records."
+        )
+
+        # all of the pairs within the largest radius are found in one pass, then filtered per object.
+        catalog = cls._reformat_table_columns(catalog)
+        _catalog_coords = SkyCoord(
+            ra=catalog["RA"].to_numpy() * u.deg, dec=catalog["DEC"].to_numpy() * u.deg
+        )
+        _source_index, _match_index, _separation, _ = _catalog_coords.search_around_sky(
+            _obj_coords, radii.max()
+        )
+        _keep = _separation <= radii[_source_index]
+
+        output_dataframe = cls._process_output(
+            pd.concat(
+                [
+                    catalog.iloc[_match_index[_keep]].reset_index(drop=True),
+                    _obj_frame.iloc[_source_index[_keep]].reset_index(drop=True),
+                ],
+                axis=1,
+            )
+        )
+
+        if writer is not None:
+            writer.put(f"XREF_{cls.__name__}", output_dataframe)
+        elif connection is not None:
+            with SQLiteWriter(connection) as _writer:
+                _writer.put(f"XREF_{cls.__name__}", output_dataframe)
+
+        mylog.info(
+            f"Completed local cross match. Found {len(output_dataframe)} matches."
+        )
+
+    @classmethod
+    def _prepare_objects(cls, objects, coordinates=None):
+        """
+        Standardize the eROSITA objects to be cross referenced.
+
+        Parameters
+        ----------
+        objects: list or :py:class:`pandas.DataFrame`
+            The ``pyROS`` objects, or a table of them containing the eROSITA columns.
+        coordinates: :py:class:`astropy.coordinates.SkyCoord`, optional
+            The (array valued) sky coordinates of ``objects``. If not provided, they are built from the objects' RA and DEC.
+
+        Returns
+        -------
+        :py:class:`pandas.DataFrame`
+            The eROSITA columns of the objects, under their XREF names.
+        :py:class:`astropy.coordinates.SkyCoord`
+            The coordinates of the objects.
+        """
+        if isinstance(objects, pd.DataFrame):
+            _obj_frame = objects.loc[:, list(_included_erosita_columns)].set_axis(
+                _included_erosita_columns_mod, axis=1
+            )
+        else:
+            # Pull everything needed from the objects in a single pass, then work on the columns.
+            _obj_frame = pd.DataFrame(
+                [[getattr(o, k) for k in _included_erosita_columns] for o in objects],
+                columns=_included_erosita_columns_mod,
+            )
+
+        if coordinates is not None:
+            _obj_coords = coordinates
+        else:
+            _obj_coords = SkyCoord(
+                ra=_obj_frame[_included_erosita_columns["RA"][0]].to_numpy() * u.deg,
+                dec=_obj_frame[_included_erosita_columns["DEC"][0]].to_numpy() * u.deg,
+                frame="icrs",
+            )
+
+        return _obj_frame, _obj_coords
+
+    @classmethod
+    def _mtqrad(cls, coordinates, radii, object_data, progress_bar):
         devLogger.debug(
             f"Querying {cls.__name__} for {len(coordinates)} objects [Thread={threading.current_thread().name}]."
         )
 
-        _thread_return_array = []
+        # responses are accumulated column-wise and turned into a single frame once the batch is done.
+        _thread_return_columns = {k: [] for k in cls._select_columns}
         _thread_error_array = []
         # Coordinate Cycling
         # -------------------#
-        for o_coord, o_rad, o_data in zip(coordinates, radii, object_data):
+        for o_coord, o_rad, o_data in zip(
+            coordinates, radii, object_data.itertuples(index=False, name=None)
+        ):
             _safe_proceed_flag = True  # hold for a valid result.
             _safe_proceed_counter = 0  # the counter to check for infinite loop.
             while _safe_proceed_flag:
-                _safe_clock_start = time.perf_counter()
                 _safe_proceed_flag = False
 
-                with warnings.catch_warnings():
-                    warnings.filterwarnings(action="ignore", module=".*")
+                ## -- Call Procedure -- #
+                # Block only if the shared call window for this database is full.
+                _rate_limiters[cls.__name__].acquire()
 
-                    ## -- Call Procedure -- #
-                    try:
-                        output_table = cls.astroquery_obj.query_region(
-                            o_coord, radius=o_rad
-                        )
-                    except requests.exceptions.ConnectTimeout:
-                        _safe_proceed_counter += 1
-
-                        if _safe_proceed_counter <= cls.retries:
-                            _safe_proceed_flag = True
-                            continue
-                        else:
-                            _thread_error_array.append(o_data)
-                            continue
+                try:
+                    output_table = cls.astroquery_obj.query_region(
+                        o_coord, radius=o_rad
+                    )
+                except requests.exceptions.ConnectTimeout:
+                    _safe_proceed_counter += 1
+
+                    if _safe_proceed_counter <= cls.retries:
+                        _safe_proceed_flag = True
+                        continue
+                    else:
+                        _thread_error_array.append(o_data)
+                        continue
+
+                ## -- Table Manipulation -- #
+                if output_table is None:
+                    continue  # --> there was no response, we just proceed as normal.
+
+                _n = len(output_table)
+                for k in cls.used_columns:
+                    if k in output_table.colnames:
+                        _column = output_table[k]
+                        if _column.dtype.kind == "S":
+                            _column = np.char.decode(_column, "utf-8")
+                        _thread_return_columns[k].extend(_column.tolist())
+                    else:
+                        _thread_return_columns[k].extend([None] * _n)
+
+                # add the eRASS data; scalars are broadcast over the rows.
+                for k, v in zip(_included_erosita_columns_mod, o_data):
+                    _thread_return_columns[k].extend([v] * _n)
 
-                    ## -- Table Manipulation -- #
-                    if output_table is None:
-                        continue  # --> there was no response, we just proceed as normal.
+        # Post Processing
+        # ----------------#
+        # Concatenation and parsing of the responses is deferred to the calling thread so that
+        # workers spend their time waiting on the network rather than on the GIL.
+        devLogger.info(f"Thread: {threading.current_thread()} -- Completed.")
 
-                    o = output_table.to_pandas()
+        with _PROGRESS_LOCK:
+            progress_bar.update(n=len(coordinates))
 
-                    for header, value in zip(_included_erosita_columns_mod, o_data):
-                        # add the eRASS data.
-                        o[header] = [value] * len(o)
+        if len(_thread_return_columns[_included_erosita_columns_mod[0]]) == 0:
+            return [], _thread_error_array
 
-                    _thread_return_array.append(o)
+        return [pd.DataFrame(_thread_return_columns)], _thread_error_array
 
-                while time.perf_counter() - _safe_clock_start < timeout:
-                    # WAIT FOR TIMEOUT REASONS IF NECESSARY.
-                    time.sleep(timeout / 5)
+    @classmethod
+    def _mtqrad_batch(cls, coordinates, radii, object_data, progress_bar):
+        devLogger.debug(
+            f"Batch querying {cls.__name__} for {len(coordinates)} objects [Thread={threading.current_thread().name}]."
+        )
 
-        # Post Processing
-        # ----------------#
-        if len(_thread_return_array) != 0:
-            # there are output arrays to manage.
-            output_dataframe = pd.concat(_thread_return_array, ignore_index=True)
-
-            # DataFrame Manipulations
-            output_dataframe = output_dataframe.loc[
-                :, list(cls.used_columns.keys()) + _included_erosita_columns_mod
-            ]
-            output_dataframe = cls._reformat_table_columns(output_dataframe)
-            output_dataframe["DELTA"] = np.sqrt(
-                (output_dataframe["RA"] - output_dataframe["ERA"]) ** 2
-                + (output_dataframe["DEC"] - output_dataframe["EDEC"]) ** 2
+        _thread_return_array = []
+        _thread_error_array = []
+        radii = u.Quantity(radii)
+
+        if len(coordinates) == 0:
+            # nothing to search around (i.e. an empty catalog).
+            return _thread_return_array, _thread_error_array
+
+        ## -- Call Procedure -- #
+        # A single cone search at the largest radius of the batch; matches are filtered per object below.
+        for _attempt in range(cls.retries + 1):
+            _rate_limiters[cls.__name__].acquire()
+
+            try:
+                output_table = cls.astroquery_obj.query_region(
+                    coordinates, radius=radii.max()
+                )
+                break
+            except requests.exceptions.ConnectTimeout:
+                continue
+        else:
+            _thread_error_array.extend(object_data.itertuples(index=False, name=None))
+            output_table = None
+
+        ## -- Table Manipulation -- #
+        if output_table is not None and len(output_table) != 0:
+            o = cls._reformat_table_columns(output_table.to_pandas())
+            _matches = SkyCoord(
+                ra=o["RA"].to_numpy() * u.deg, dec=o["DEC"].to_numpy() * u.deg
             )
-            output_dataframe.rename(
-                columns={k: v[0] for k, v in cls.used_columns.items()}, inplace=True
+
+            if "SCRIPT_NUMBER_ID" in o.columns:
+                # each match is labeled with the (1-indexed) coordinate it was found around.
+                _source_index = o["SCRIPT_NUMBER_ID"].to_numpy() - 1
+                _match_index = np.arange(len(o))
+
+                # keep only the matches within the search radius of their own object.
+                _keep = _filter_matches(
+                    coordinates.ra.radian[_source_index],
+                    coordinates.dec.radian[_source_index],
+                    _matches.ra.radian,
+                    _matches.dec.radian,
+                    radii.to_value("rad")[_source_index],
+                )
+            else:
+                (
+                    _match_index,
+                    _source_index,
+                    _separation,
+                    _,
+                ) = coordinates.search_around_sky(_matches, radii.max())
+                _keep = _separation <= radii[_source_index]
+
+            _thread_return_array.append(
+                pd.concat(
+                    [
+                        o.iloc[_match_index[_keep]].reset_index(drop=True),
+                        object_data.iloc[_source_index[_keep]].reset_index(drop=True),
+                    ],
+                    axis=1,
+                )
             )
 
-            # Saving the output to the SQL database.
-            with threading.Lock():
-                engine = sqlalchemy.create_engine(f"sqlite:///{connection}")
-                with engine.connect() as conn:
-                    devLogger.info(
-                        f"Writing {len(output_dataframe)} to {connection}. [Thread={threading.current_thread().name}]"
-                    )
-                    output_dataframe.to_sql(
-                        f"XREF_{cls.__name__}",
-                        con=conn,
-                        if_exists="append",
-                        index=False,
-                        dtype={
-                            **{k: v[1] for k, v in cls.used_columns.items()},
-                            **{
-                                v[0]: v[1] for k, v in _included_erosita_columns.items()
-                            },
-                        },
+        with _PROGRESS_LOCK:
+            progress_bar.update(n=len(coordinates))
+
+        return _thread_return_array, _thread_error_array
+
+    @classmethod
+    def _mtqrad_tap(cls, coordinates, radii, object_data, progress_bar):
+        devLogger.debug(
+            f"Querying {cls.__name__} TAP service for {len(coordinates)} objects [Thread={threading.current_thread().name}]."
+        )
+
+        _thread_return_array = []
+        _thread_error_array = []
+
+        if len(coordinates) == 0:
+            # nothing to upload (i.e. an empty catalog).
+            return _thread_return_array, _thread_error_array
+
+        # Building the upload table and ADQL query
+        # -----------------------------------------#
+        upload_table = Table(
+            {
+                "xref_index": np.arange(len(coordinates)),
+                "ra": coordinates.ra.to_value("deg"),
+                "dec": coordinates.dec.to_value("deg"),
+                "radius": u.Quantity(radii).to_value("deg"),
+            }
+        )
+        _selection = ", ".join(
+            f'b.{k} AS "{v}"' for k, v in cls.tap_service["columns"].items()
+        )
+        query = (
+            f"SELECT {_selection}, m.xref_index AS xref_index "
+            f"FROM {cls.tap_service['table']} AS b "
+            "JOIN TAP_UPLOAD.xref_targets AS m "
+            "ON 1=CONTAINS(POINT('ICRS', b.ra, b.dec), CIRCLE('ICRS', m.ra, m.dec, m.radius))"
+        )
+
+        ## -- Call Procedure -- #
+        for _attempt in range(cls.retries + 1):
+            _rate_limiters[cls.__name__].acquire()
+
+            try:
+                output_table = (
+                    TapPlus(url=cls.tap_service["url"])
+                    .launch_job_async(
+                        query,
+                        upload_resource=upload_table,
+                        upload_table_name="xref_targets",
                     )
-            devLogger.info(f"Thread: {threading.current_thread()} -- Completed.")
+                    .get_results()
+                )
+                break
+            except requests.exceptions.ConnectTimeout:
+                continue
+        else:
+            _thread_error_array.extend(object_data.itertuples(index=False, name=None))
+            output_table = None
+
+        ## -- Table Manipulation -- #
+        if output_table is not None and len(output_table) != 0:
+            output_dataframe = output_table.to_pandas()
+
+            # add the eRASS data for the object each match belongs to.
+            output_dataframe = pd.concat(
+                [
+                    output_dataframe.drop(columns="xref_index"),
+                    object_data.iloc[output_dataframe["xref_index"]].reset_index(
+                        drop=True
+                    ),
+                ],
+                axis=1,
+            )
+            _thread_return_array.append(output_dataframe)
 
-        with threading.Lock():
+        with _PROGRESS_LOCK:
             progress_bar.update(n=len(coordinates))
 
-        return _thread_error_array
+        return _thread_return_array, _thread_error_array
+
+    @classmethod
+    def _process_output(cls, output_dataframe):
+        """
+        Convert raw query responses into the XREF table schema.
+
+        Parameters
+        ----------
+        output_dataframe: :py:class:`pandas.DataFrame`
+            The concatenated responses from the database with the eROSITA columns attached.
+
+        Returns
+        -------
+        :py:class:`pandas.DataFrame`
+            The reformatted table, ready to be written to the XREF database.
+        """
+        output_dataframe = cls._reformat_table_columns(
+            output_dataframe.reindex(columns=cls._select_columns)
+        )
+        output_dataframe["DELTA"] = np.sqrt(
+            (output_dataframe["RA"] - output_dataframe["ERA"]) ** 2
+            + (output_dataframe["DEC"] - output_dataframe["EDEC"]) ** 2
+        )
+
+        return output_dataframe.rename(columns=cls._rename_map)
 
     @classmethod
     def _reformat_table_columns(cls, table):
@@ -279,6 +707,10 @@ class SIMBAD(Database):
         "schema"
     ]  #: The columns to include for this database reference class.
     retries = cgparams["REFDB"]["SIMBAD"]["retries"]  #: number of retries to give.
+    tap_service = cgparams["REFDB"]["SIMBAD"][
+        "tap"
+    ]  #: TAP service for bulk cone searches.
+    batch_queries = True  #: Query each batch of coordinates in a single call.
 
     def __init__(self, *args, **kwargs):
         pass
@@ -289,6 +721,24 @@ class SIMBAD(Database):
 
     @classmethod
     def _reformat_table_columns(cls, table):
-        table["DEC"] = [Angle(k + " degrees").to_value("deg") for k in table["DEC"]]
-        table["RA"] = [Angle(k + " hours").to_value("deg") for k in table["RA"]]
+        if pd.api.types.is_numeric_dtype(table["RA"]):
+            # TAP responses are already in degrees.
+            return table
+
+        # parse the sexagesimal strings as one array-valued SkyCoord rather than row by row.
+        _coordinates = SkyCoord(
+            table["RA"].to_numpy(), table["DEC"].to_numpy(), unit=(u.hourangle, u.deg)
+        )
+        table["RA"] = _coordinates.ra.to_value("deg")
+        table["DEC"] = _coordinates.dec.to_value("deg")
         return table
+
+
+# -- registry of the available reference databases -- #
+_DATABASE_REGISTRY = {_db.__name__: _db for _db in Database.__subclasses__()}
+
+# -- shared rate limiters; one call window per reference database -- #
+_rate_limiters = {
+    _name: RateLimiter(_db.max_call_frequency)
+    for _name, _db in _DATABASE_REGISTRY.items()
+}
@@ -5,12 +5,20 @@ import functools
 import logging
 import os
 import pathlib as pt
+import queue
+import sqlite3
 import sys
+import threading
+from itertools import islice
 
 import matplotlib.pyplot as plt
+import pandas as pd
+import requests
 import sqlalchemy as sql
 import yaml
+from requests.adapters import HTTPAdapter
 from unyt import unyt_array
+from urllib3.util.retry import Retry
 
 # -- configuration directory -- #
 _config_directory = os.path.join(pt.Path(__file__).parents[0], "bin", "config.yaml")
@@ -162,6 +170,207 @@ def split(a, n):
     return [a[i * k + min(i, m) : (i + 1) * k + min(i + 1, m)] for i in range(n)]
 
 
+#: HTTP session shared by the data product downloads and the reference database queries.
+HTTP_SESSION = requests.Session()
+
+# connections are kept alive for reuse; transient server errors are retried with backoff. Timeouts and throttling
+# (429) are left to the callers, whose own retries go through the database rate limiters.
+_HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=50,
+    pool_maxsize=50,
+    max_retries=Retry(
+        total=3,
+        connect=0,
+        read=0,
+        backoff_factor=0.5,
+        status_forcelist=[500, 502, 503, 504],
+    ),
+)
+HTTP_SESSION.mount("https://", _HTTP_ADAPTER)
+HTTP_SESSION.mount("http://", _HTTP_ADAPTER)
+
+
+def create_sqlite_engine(path):
+    """Create an SQLAlchemy engine for the SQLite database at ``path``, configured for bulk writes."""
+    # a single connection is shared by every thread using the engine.
+    engine = sql.create_engine(
+        f"sqlite:///{path}",
+        poolclass=sql.pool.StaticPool,
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+
+    @sql.event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    return engine
+
+
+_ENGINE_CACHE = {}
+_ENGINE_CACHE_LOCK = threading.Lock()
+
+
+def get_sqlite_engine(path):
+    """Fetch the shared engine for the SQLite database at ``path``, creating it on first use."""
+    _key = os.path.abspath(path)
+
+    with _ENGINE_CACHE_LOCK:
+        if _key not in _ENGINE_CACHE:
+            _ENGINE_CACHE[_key] = create_sqlite_engine(_key)
+
+        return _ENGINE_CACHE[_key]
+
+
+def dispose_sqlite_engine(path):
+    """Close and forget the shared engine for ``path`` (i.e. before the database file is removed)."""
+    with _ENGINE_CACHE_LOCK:
+        engine = _ENGINE_CACHE.pop(os.path.abspath(path), None)
+
+    if engine is not None:
+        engine.dispose()
+
+
+#: Connection settings for bulk ingest; the in-transaction pages are kept in memory until they are committed.
+_BULK_INGEST_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-200000",
+)
+
+
+class SQLiteWriter:
+    """
+    Background writer which appends DataFrames to the tables of an SQLite database.
+
+    Any number of threads may queue frames with :py:meth:`SQLiteWriter.put`; a single writer thread inserts them with
+    prepared ``executemany`` statements. The rows are committed every ``commit_every`` chunks and when the writer is
+    closed, so a long run is durable up to its last commit without paying for a commit per chunk.
+    """
+
+    def __init__(self, path, chunksize=1000, commit_every=100):
+        """
+        Initializes the :py:class:`SQLiteWriter` instance and starts its writer thread.
+
+        Parameters
+        ----------
+        path: str
+            The path to the SQLite database. The tables written to must already exist.
+        chunksize: int, optional
+            The number of rows passed to each ``executemany`` call. Default is ``1000``.
+        commit_every: int, optional
+            The number of chunks written per transaction. Default is ``100``.
+        """
+        self.path = path
+        self.chunksize = chunksize
+        self.commit_every = commit_every
+        self.rows_written = 0
+
+        self._queue = queue.Queue()
+        self._statements = {}
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, name=f"SQLiteWriter-{pt.Path(path).name}", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        # whatever was queued before the failure is kept; the database is left partial rather than rolled back.
+        self.close()
+
+        if exc_type is not None:
+            mylog.warning(
+                f"{self.path} is incomplete: writing stopped after {self.rows_written} rows because of an error."
+            )
+
+    def put(self, table_name, dataframe):
+        """Queue ``dataframe`` to be appended to the table ``table_name``."""
+        # a failed writer will never write anything else; fail the caller now rather than at close().
+        if self._error is not None:
+            raise self._error
+
+        if len(dataframe) != 0:
+            self._queue.put((table_name, dataframe))
+
+    def close(self):
+        """Write everything still queued, commit it and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def _statement(self, table_name, columns):
+        _key = (table_name, columns)
+
+        if _key not in self._statements:
+            _columns = ", ".join(f'"{c}"' for c in columns)
+            _placeholders = ", ".join("?" * len(columns))
+            self._statements[
+                _key
+            ] = f'INSERT INTO "{table_name}" ({_columns}) VALUES ({_placeholders})'
+
+        return self._statements[_key]
+
+    @staticmethod
+    def _bindable(dataframe):
+        """Replace the missing values of nullable (extension dtype) columns with ``None``, which sqlite3 binds as NULL."""
+        _nullable = [
+            k
+            for k, v in dataframe.dtypes.items()
+            if isinstance(v, pd.api.extensions.ExtensionDtype)
+        ]
+
+        if len(_nullable) == 0:
+            return dataframe
+
+        return dataframe.assign(
+            **{
+                k: dataframe[k].astype(object).where(dataframe[k].notna(), None)
+                for k in _nullable
+            }
+        )
+
+    def _run(self):
+        conn = sqlite3.connect(
+            os.path.abspath(self.path), timeout=30, isolation_level=None
+        )
+
+        try:
+            for pragma in _BULK_INGEST_PRAGMAS:
+                conn.execute(f"PRAGMA {pragma}")
+
+            _chunks = 0
+            conn.execute("BEGIN")
+            for table_name, dataframe in iter(self._queue.get, None):
+                _statement = self._statement(table_name, tuple(dataframe.columns))
+                _rows = self._bindable(dataframe).itertuples(index=False, name=None)
+
+                while _chunk := list(islice(_rows, self.chunksize)):
+                    conn.executemany(_statement, _chunk)
+                    self.rows_written += len(_chunk)
+
+                    _chunks += 1
+                    if _chunks % self.commit_every == 0:
+                        conn.execute("COMMIT")
+                        conn.execute("BEGIN")
+
+            conn.execute("COMMIT")
+        except Exception as error:
+            self._error = error
+
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        finally:
+            conn.close()
+
+
 def load_object_data():
     object_dir = os.path.join(pt.Path(__file__).parents[0], "bin", "object_dat.yaml")
 
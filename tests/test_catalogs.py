@@ -0,0 +1,87 @@
+"""
+Tests for the :py:mod:`pyROS.erosita.catalogs` module.
+"""
+import sqlite3
+import sys
+
+import numpy as np
+import pytest
+from astropy.table import Table
+
+from pyROS.erosita.catalogs import eROSITACatalog
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """A small catalog with known positional errors."""
+    path = str(tmp_path / "catalog.fits")
+    Table(
+        {
+            "UID": [0, 1, 2, 3],
+            "RA": [10.0, 10.0, 10.0, 10.0],
+            "DEC": [0.0, 90.0, 30.0, 30.0],
+            "RA_LOWERR": [3.0, -3.0, 2.0, np.nan],
+            "RA_UPERR": [1.0, 1.0, 1.0, 1.0],
+            "DEC_LOWERR": [4.0, 4.0, 0.0, 1.0],
+            "DEC_UPERR": [-2.0, 2.0, 0.0, 1.0],
+            "EXT": [6.0, 0.0, 0.0, 0.0],
+        }
+    ).write(path)
+
+    return eROSITACatalog(path)
+
+
+@pytest.mark.parametrize("use_numexpr", [True, False])
+def test_xref_radii(catalog, monkeypatch, use_numexpr):
+    """The error radius is hypot(dec_err, sin(dec) * ra_err), scaled by the factor and offset by the extent."""
+    if use_numexpr:
+        pytest.importorskip("numexpr")
+    else:
+        monkeypatch.setitem(sys.modules, "numexpr", None)
+
+    radii = catalog._xref_radii(factor=3).to_value("arcmin")
+
+    # dec=0: only the Dec error; dec=90: hypot(4, 3) = 5; dec=30: 0.5 * 2; NaN errors fall back to 1 arcmin.
+    np.testing.assert_allclose(
+        radii, [(3 * 4 + 6) / 60, 3 * 5 / 60, 3 * 1 / 60, 1.0], rtol=1e-12
+    )
+
+
+def test_add_table_to_xref(tmp_path):
+    """The catalog is written with column types matching its dtypes, and rewriting it replaces the table."""
+    path = str(tmp_path / "catalog.fits")
+    Table(
+        {
+            "UID": [0, 1, 2],
+            "RA": [10.0, 20.0, 30.0],
+            "DETUID": ["a", "b", "c"],
+        }
+    ).write(path)
+    catalog = eROSITACatalog(path)
+    database = str(tmp_path / "xref.db")
+
+    # writing twice replaces, rather than appends to, the existing copy.
+    catalog.add_table_to_xref(database)
+    catalog.add_table_to_xref(database)
+
+    with sqlite3.connect(database) as conn:
+        types = {row[1]: row[2] for row in conn.execute('PRAGMA table_info("eROSITA")')}
+        rows = conn.execute(
+            'SELECT "UID", "RA", "DETUID" FROM "eROSITA" ORDER BY "UID"'
+        ).fetchall()
+        indexes = [row[1] for row in conn.execute('PRAGMA index_list("eROSITA")')]
+
+    assert types == {"UID": "INTEGER", "RA": "REAL", "DETUID": "TEXT"}
+    assert rows == list(catalog.data.itertuples(index=False, name=None))
+    assert indexes == ["ix_eROSITA_UID"]
+
+
+def test_fitsio_engine_non_fits(tmp_path):
+    """Catalogs which are not FITS files are read with astropy even if fitsio is requested."""
+    path = str(tmp_path / "catalog.ecsv")
+    Table({"UID": [0, 1], "RA": [10.0, 20.0]}).write(path)
+
+    catalog = eROSITACatalog(path, format="ascii.ecsv", engine="fitsio")
+
+    assert list(catalog.UID) == [0, 1]
+    np.testing.assert_array_equal(catalog.RA, [10.0, 20.0])
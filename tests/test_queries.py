@@ -0,0 +1,177 @@
+"""
+Tests for the :py:mod:`pyROS.queries` module.
+"""
+import sqlite3
+import time
+
+import astropy.units as u
+import numpy as np
+import pandas as pd
+import pytest
+from astropy.coordinates import SkyCoord
+from astropy.table import Table
+
+from pyROS.erosita.catalogs import eROSITACatalog
+from pyROS.queries import Database, RateLimiter, _filter_matches_numpy
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """Two sources on the equator with search radii of 1 arcmin and 6 arcsec."""
+    path = str(tmp_path / "catalog.fits")
+    Table(
+        {
+            "UID": [0, 1],
+            "RA": [10.0, 20.0],
+            "DEC": [0.0, 0.0],
+            "RA_LOWERR": [0.0, 0.0],
+            "RA_UPERR": [0.0, 0.0],
+            "DEC_LOWERR": [20.0, 2.0],
+            "DEC_UPERR": [20.0, 2.0],
+            "EXT": [0.0, 0.0],
+        }
+    ).write(path)
+
+    return eROSITACatalog(path)
+
+
+@pytest.fixture
+def local_ned():
+    """A local copy of NED with matches at increasing distances from both sources."""
+    return pd.DataFrame(
+        {
+            "Object Name": ["A30", "A90", "B3", "B30"],
+            "Type": ["G", "G", "QSO", "QSO"],
+            "RA": [10 + 30 / 3600, 10 + 90 / 3600, 20 + 3 / 3600, 20 + 30 / 3600],
+            "DEC": [0.0, 0.0, 0.0, 0.0],
+        }
+    )
+
+
+def test_query_offline(catalog, local_ned, tmp_path):
+    """Only the matches within the search radius of their own source are kept."""
+    path = str(tmp_path / "xref.db")
+    catalog.xref(path, included_databases=["NED"], offline_catalogs={"NED": local_ned})
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute(
+            'SELECT "Object", "UID" FROM "XREF_NED" ORDER BY "Object"'
+        ).fetchall()
+
+    # B30 is within the largest radius of the batch, but not within that of its own source.
+    assert rows == [("A30", 0), ("B3", 1)]
+
+
+def test_query_offline_factor(catalog, local_ned, tmp_path):
+    """The search radii passed to the cross match are scaled by the xref factor."""
+    path = str(tmp_path / "xref.db")
+    catalog.xref(
+        path,
+        included_databases=["NED"],
+        offline_catalogs={"NED": local_ned},
+        factor=9,
+    )
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute(
+            'SELECT "Object", "UID" FROM "XREF_NED" ORDER BY "Object"'
+        ).fetchall()
+
+    # the radii grow to 3 arcmin and 18 arcsec.
+    assert rows == [("A30", 0), ("A90", 0), ("B3", 1)]
+
+
+def test_query_offline_keeps_catalog(catalog, tmp_path):
+    """A local catalog passed as a table is not modified by the cross match."""
+    _coordinates = SkyCoord(ra=[10.0] * u.deg, dec=[0.0] * u.deg)
+    local_simbad = pd.DataFrame(
+        {
+            "MAIN_ID": ["A"],
+            "OTYPE": ["G"],
+            "RA": _coordinates.ra.to_string(unit=u.hour, sep=" "),
+            "DEC": _coordinates.dec.to_string(sep=" "),
+        }
+    )
+    _original = local_simbad.copy()
+
+    catalog.xref(
+        str(tmp_path / "xref.db"),
+        included_databases=["SIMBAD"],
+        offline_catalogs={"SIMBAD": local_simbad},
+    )
+
+    pd.testing.assert_frame_equal(local_simbad, _original)
+
+
+def test_query_offline_missing_columns(catalog, local_ned):
+    """A local catalog without the database's columns is rejected."""
+    with pytest.raises(ValueError, match="Object Name"):
+        Database("NED").query_offline(
+            catalog.data,
+            catalog.xref_radii,
+            local_ned.drop(columns="Object Name"),
+        )
+
+
+def test_query_offline_no_objects(catalog, local_ned):
+    """An empty set of objects is a no-op."""
+    Database("NED").query_offline(
+        catalog.data.iloc[:0], np.array([]) * u.arcmin, local_ned
+    )
+
+
+def test_rate_limiter():
+    """Calls burst up to the limit, after which they wait for the window to have room."""
+    limiter = RateLimiter(3, period=0.2)
+
+    _start = time.monotonic()
+    for _ in range(3):
+        limiter.acquire()
+    assert time.monotonic() - _start < 0.1
+
+    # the fourth call waits for the first to leave the window.
+    limiter.acquire()
+    assert time.monotonic() - _start >= 0.2
+
+
+@pytest.fixture
+def random_pairs():
+    """Random source/candidate pairs with separations on the order of their search radii, in radians."""
+    rng = np.random.default_rng(0)
+    _n = 10000
+
+    ra_s = rng.uniform(0, 2 * np.pi, _n)
+    dec_s = np.arcsin(rng.uniform(-1, 1, _n))
+    ra_m = ra_s + rng.normal(0, 1e-3, _n)
+    dec_m = np.clip(dec_s + rng.normal(0, 1e-3, _n), -np.pi / 2, np.pi / 2)
+    radii = rng.uniform(0, 2e-3, _n)
+
+    separation = (
+        SkyCoord(ra=ra_s * u.rad, dec=dec_s * u.rad)
+        .separation(SkyCoord(ra=ra_m * u.rad, dec=dec_m * u.rad))
+        .to_value("rad")
+    )
+
+    # pairs within rounding of the boundary may fall on either side of it.
+    _clear = np.abs(separation - radii) > 1e-12
+    return (
+        tuple(a[_clear] for a in (ra_s, dec_s, ra_m, dec_m, radii)),
+        separation[_clear] <= radii[_clear],
+    )
+
+
+def test_filter_matches_numpy(random_pairs):
+    """The haversine mask agrees with the astropy separations."""
+    pairs, expected = random_pairs
+
+    np.testing.assert_array_equal(_filter_matches_numpy(*pairs), expected)
+
+
+def test_filter_matches_numba(random_pairs):
+    """The compiled mask agrees with the astropy separations."""
+    pytest.importorskip("numba")
+    from pyROS.queries import _filter_matches
+
+    pairs, expected = random_pairs
+
+    np.testing.assert_array_equal(_filter_matches(*pairs), expected)
@@ -0,0 +1,69 @@
+"""
+Tests for the :py:mod:`pyROS.utils` module.
+"""
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyROS.utils import SQLiteWriter
+
+
+def test_sqlite_writer_nullable_columns(tmp_path):
+    """Missing values of nullable (extension dtype) columns are written as NULL."""
+    path = str(tmp_path / "test.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE "T" ("UID" INTEGER, "FLAG" INTEGER, "X" REAL)')
+
+    dataframe = pd.DataFrame(
+        {
+            "UID": [0, 1, 2],
+            "FLAG": pd.array([1, pd.NA, 3], dtype="Int64"),
+            "X": [0.5, np.nan, 2.5],
+        }
+    )
+
+    with SQLiteWriter(path) as writer:
+        writer.put("T", dataframe)
+
+    assert writer.rows_written == 3
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute('SELECT * FROM "T" ORDER BY "UID"').fetchall()
+
+    assert rows == [(0, 1, 0.5), (1, None, None), (2, 3, 2.5)]
+
+
+def test_sqlite_writer_periodic_commits(tmp_path):
+    """Rows committed before a writer error persist; only the open transaction is rolled back."""
+    path = str(tmp_path / "test.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE "T" ("UID" INTEGER)')
+
+    writer = SQLiteWriter(path, chunksize=1, commit_every=2)
+    writer.put("T", pd.DataFrame({"UID": [0, 1, 2]}))
+    writer.put("MISSING", pd.DataFrame({"UID": [3]}))
+
+    with pytest.raises(sqlite3.OperationalError, match="MISSING"):
+        writer.close()
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute('SELECT "UID" FROM "T" ORDER BY "UID"').fetchall()
+
+    assert rows == [(0,), (1,)]
+
+
+def test_sqlite_writer_keeps_rows_on_error(tmp_path):
+    """Frames queued before an exception in the managing block are still written."""
+    path = str(tmp_path / "test.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE "T" ("UID" INTEGER)')
+
+    with pytest.raises(RuntimeError):
+        with SQLiteWriter(path) as writer:
+            writer.put("T", pd.DataFrame({"UID": [0, 1]}))
+            raise RuntimeError("query failed")
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM "T"').fetchone() == (2,)